@@ -1,90 +1,503 @@
 # main.py
 
+import asyncio
 import json
+import os
 import subprocess
-import shlex
 import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime
+from collections.abc import AsyncIterator, Awaitable
 from typing import Any
+from urllib.parse import unquote
+
+import aiohttp
+
+# ✅ 优先使用 orjson (C/Rust 实现) 序列化 JSON，未安装时回退到标准库 json
+try:
+    import orjson
+
+    def _dumps(data: Any, indent: bool = False) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else None)
+
+except ImportError:
+
+    def _dumps(data: Any, indent: bool = False) -> bytes:
+        # 输出格式与 orjson 保持一致，保证两种实现得到的 CID 相同
+        if indent:
+            return json.dumps(data, indent=2, ensure_ascii=False).encode()
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+# ✅ 优先使用 blake3 (Rust 实现) 计算内容摘要，未安装时回退到标准库 blake2b
+try:
+    from blake3 import blake3 as _hasher
+except ImportError:
+    from hashlib import blake2b as _hasher
+
+_HASH_NAME = _hasher().name
+
 
 # ✅ 配置开关
 # 设置为 True  -> 生成 1.json, 2.json... (用于需要后缀的合约)
 # 设置为 False -> 生成 1, 2... (用于标准 ERC721A 合约)
 USE_JSON_SUFFIX = False
 
+# IPFS 节点的 HTTP API 地址 (Kubo 默认监听 5001 端口)
+IPFS_API_URL = "http://127.0.0.1:5001/api/v0"
+
+# IPFS 仓库目录 (与 Kubo 一致，可通过 IPFS_PATH 环境变量覆盖)
+# 节点运行时会把 API 的实际监听地址写入仓库下的 api 文件
+IPFS_REPO_PATH = Path(os.environ.get("IPFS_PATH", "~/.ipfs")).expanduser()
+
+# api 文件中可以直接通过 TCP 连接的 multiaddr 协议
+IPFS_API_HOST_PROTOCOLS = ("ip4", "ip6", "dns", "dns4", "dns6")
+
+# ✅ 启动时解析一次 ipfs 可执行文件的绝对路径，避免每次调用都搜索 $PATH
+IPFS_BIN = shutil.which("ipfs")
+
+# 所有本地产物的输出根目录 (只在导入时计算一次)
+OUTPUT_ROOT = Path(__file__).resolve().parent / "output"
+
+# 内容摘要 -> CID 的本地缓存，内容未变化时直接复用 CID，跳过上传
+# 命中缓存后仍会向当前节点确认该 CID 处于 pin 状态 (可能已被 pin rm + gc，
+# 或 IPFS_PATH 指向了另一个节点)，未 pin 时照常重新上传
+CID_CACHE_PATH = OUTPUT_ROOT / ".ipfs_cache.json"
+
+# 设置为 True  -> 批量流程同时把元数据写入本地 output 文件夹 (用于之后上传到 Pinata)
+# 设置为 False -> 元数据只在内存中生成并直接上传，不落盘
+SAVE_METADATA_LOCALLY = True
+
+# 设置为 True  -> 批量流程用硬链接把图片"复制"到输出目录 (不产生数据拷贝)
+# 设置为 False -> 总是完整复制图片文件
+LINK_IMAGES = True
+
+# 批量流程识别的图片后缀
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".gif")
+
+# 批量生成/写入元数据时使用的线程数上限
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# 设置为 True  -> 上传函数不再逐条打印过程信息，只返回 CID (出错信息仍会打印)
+# 设置为 False -> 打印每次上传的详细过程
+QUIET = True
+
+# 批量处理时汇总输出进度的间隔 (秒)
+PROGRESS_INTERVAL = 1.0
+
+# 与 IPFS 节点之间的最大并发连接数
+IPFS_MAX_CONNECTIONS = 64
+
+# 连接 IPFS 节点的超时时间 (秒)。上传本身不设总时长上限，大文件夹可能需要很久
+IPFS_CONNECT_TIMEOUT = 10
+
+# 流式上传文件时每次读取的块大小
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
 ################################################################
-# 核心上传函数 (使用 subprocess)
+# 核心上传函数 (使用 IPFS HTTP API)
 ################################################################
 
 
-def upload_to_ipfs(target_path: Path) -> str | None:
+def _ipfs_api_endpoint() -> tuple[str | None, str]:
+    """
+    读取本地节点写入仓库 api 文件的实际监听地址，返回 (Unix 套接字路径, API 根地址)。
+    支持 /unix/<路径> 与 /ip4|ip6|dns|dns4|dns6/<主机>/tcp/<端口> 两种 multiaddr，
+    只有 api 文件不存在 (节点未运行或不在本机) 时才回退到 IPFS_API_URL。
+    """
+    try:
+        api_addr = (IPFS_REPO_PATH / "api").read_text().strip()
+    except OSError:
+        return None, IPFS_API_URL
+
+    if api_addr.startswith("/unix/"):
+        # 新版 multiaddr 会把整个路径编码为一段 (/unix/%2Ftmp%2Fipfs.sock)
+        socket_path = unquote(api_addr.removeprefix("/unix/"))
+        if not socket_path.startswith("/"):
+            socket_path = f"/{socket_path}"
+        if Path(socket_path).exists():
+            # 经由套接字连接时 URL 中的主机名只用于 Host 请求头
+            return socket_path, IPFS_API_URL
+        return None, IPFS_API_URL
+
+    parts = api_addr.split("/")
+    if len(parts) < 5 or parts[1] not in IPFS_API_HOST_PROTOCOLS or parts[3] != "tcp":
+        return None, IPFS_API_URL
+    host, port = parts[2], parts[4]
+    # 节点监听在所有网卡上时，通过回环地址访问
+    host = {"0.0.0.0": "127.0.0.1", "::": "::1"}.get(host, host)
+    if ":" in host:
+        host = f"[{host}]"
+    return None, f"http://{host}:{port}/api/v0"
+
+
+def _ipfs_session() -> aiohttp.ClientSession:
+    """
+    创建访问 IPFS HTTP API 的会话，同一工作流内的所有上传共享 keep-alive 连接。
+    API 地址取自节点的 api 文件: 提供 Unix 套接字时直接使用，省去 TCP 回环。
+    """
+    # 两种连接器都限制同时打开的连接数，避免并发上传时压垮本地节点
+    socket_path, api_url = _ipfs_api_endpoint()
+    if socket_path:
+        connector = aiohttp.UnixConnector(path=socket_path, limit=IPFS_MAX_CONNECTIONS)
+    else:
+        connector = aiohttp.TCPConnector(limit=IPFS_MAX_CONNECTIONS)
+    # aiohttp 默认总超时为 5 分钟，会中断大文件夹的上传，因此只限制建立连接的时间
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=IPFS_CONNECT_TIMEOUT)
+    # 请求中只写相对路径 (如 "add")，由 base_url 补全为完整的 API 地址
+    return aiohttp.ClientSession(
+        base_url=f"{api_url}/", connector=connector, timeout=timeout
+    )
+
+
+async def _read_file_chunks(path: Path) -> AsyncIterator[bytes]:
+    """
+    按块读取文件: 真正发送时才打开，读完立即关闭。
+    文件夹中的文件再多，同一时刻也只占用一个文件句柄。
+    """
+    with open(path, "rb") as f:
+        while chunk := await asyncio.to_thread(f.read, UPLOAD_CHUNK_SIZE):
+            yield chunk
+
+
+async def _ipfs_add(
+    session: aiohttp.ClientSession,
+    parts: list[tuple[str, Any, str]],
+    params: dict[str, str] | None = None,
+) -> str:
+    """
+    调用 IPFS HTTP API 的 /add 接口，返回根节点的 CID。
+    parts 为 (文件名, 内容, Content-Type) 列表，请求体以流的方式边读边发。
+    """
+    query = {"quiet": "true", "cid-version": "1"}
+    if params:
+        query.update(params)
+    form = aiohttp.FormData()
+    for filename, value, content_type in parts:
+        form.add_field("file", value, filename=filename, content_type=content_type)
+    async with session.post("add", params=query, data=form) as resp:
+        resp.raise_for_status()
+        text = await resp.text()
+    # 返回结果为逐行 JSON，最后一行即为根节点 (单个文件或包裹目录)
+    lines = text.splitlines()
+    if not lines:
+        raise aiohttp.ClientPayloadError("IPFS 节点没有返回任何结果")
+    entry = json.loads(lines[-1])
+    if "Hash" not in entry:
+        raise aiohttp.ClientPayloadError(
+            f"IPFS 节点返回错误: {entry.get('Message', entry)}"
+        )
+    # 中途出错时 Kubo 仍返回 200 (错误放在 X-Stream-Error 尾部)，最后一行只是某个文件，
+    # 因此包裹目录必须以 Name 为空的条目结尾，否则视为上传失败
+    if query.get("wrap-with-directory") == "true" and entry.get("Name") != "":
+        raise aiohttp.ClientPayloadError(
+            f"IPFS 节点未返回包裹目录，上传可能中途失败 (最后一项: {entry.get('Name')})"
+        )
+    return entry["Hash"]
+
+
+def _file_part(name: str, path: Path) -> tuple[str, Any, str]:
     """
-    上传一个文件或整个文件夹到 IPFS CLI。
+    构造一个从磁盘流式读取的 multipart 文件字段。
+    """
+    return (name, _read_file_chunks(path), "application/octet-stream")
+
+
+def _walk_folder(folder: Path) -> list[tuple[str, Path | None]]:
+    """
+    按 multipart 要求的顺序列出文件夹内容: 子目录在前，文件紧随其后。
+    返回 (相对路径, 文件路径) 列表，子目录的文件路径为 None。
+    与 `ipfs add -r` 一致，跳过以 "." 开头的隐藏文件。
+    符号链接按其指向的文件内容上传 (与 _list_image_files 保持一致)，失效的链接会被跳过。
+    """
+    entries: list[tuple[str, Path | None]] = []
+    for root, dir_names, file_names in os.walk(folder):
+        dir_names[:] = sorted(d for d in dir_names if not d.startswith("."))
+        root_path = Path(root)
+        if root_path != folder:
+            entries.append((root_path.relative_to(folder).as_posix(), None))
+        for name in sorted(file_names):
+            if name.startswith("."):
+                continue
+            file_path = root_path / name
+            if not file_path.is_file():
+                continue
+            entries.append((file_path.relative_to(folder).as_posix(), file_path))
+    return entries
+
+
+def _collect_folder_parts(folder: Path) -> list[tuple[str, Any, str]]:
+    """
+    将文件夹内容转换为 multipart 字段。
+    """
+    return [
+        _file_part(rel_name, path)
+        if path is not None
+        else (rel_name, b"", "application/x-directory")
+        for rel_name, path in _walk_folder(folder)
+    ]
+
+
+def _file_hash(file_path: Path):
+    """
+    分块读取文件并计算摘要，避免一次性将大文件读入内存。
+    """
+    h = _hasher()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            _ = h.update(chunk)
+    return h
+
+
+def _content_digest(target_path: Path) -> str:
+    """
+    计算文件或文件夹 (含所有相对路径) 的内容摘要，作为 CID 缓存的键。
+    """
+    if target_path.is_file():
+        return f"{_HASH_NAME}:{_file_hash(target_path).hexdigest()}"
+
+    hasher = _hasher()
+    for rel_name, path in _walk_folder(target_path):
+        _ = hasher.update(rel_name.encode() + b"\0")
+        if path is None:
+            _ = hasher.update(b"/")
+        else:
+            _ = hasher.update(_file_hash(path).digest())
+    return f"{_HASH_NAME}:{hasher.hexdigest()}"
+
+
+def _files_digest(files: list[tuple[str, bytes]]) -> str:
+    """
+    计算一组内存文件的内容摘要，作为 CID 缓存的键。
+    """
+    hasher = _hasher()
+    for name, content in files:
+        _ = hasher.update(name.encode() + b"\0")
+        _ = hasher.update(_hasher(content).digest())
+    return f"{_HASH_NAME}:{hasher.hexdigest()}"
+
+
+async def _ipfs_is_pinned(session: aiohttp.ClientSession, cid: str) -> bool:
+    """
+    确认当前节点仍然 pin 着该 CID (未 pin 时 Kubo 返回非 200 状态码)。
+    """
+    try:
+        async with session.post(
+            "pin/ls", params={"arg": cid, "type": "recursive"}
+        ) as resp:
+            return resp.status == 200
+    except aiohttp.ClientError:
+        return False
+
+
+def _load_cid_cache() -> dict[str, str]:
+    """
+    读取本地 CID 缓存，文件不存在或已损坏时返回空缓存。
+    """
+    try:
+        return json.loads(CID_CACHE_PATH.read_bytes())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cid_cache(cache: dict[str, str]):
+    """
+    将 CID 缓存写回本地。
+    """
+    CID_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    _ = CID_CACHE_PATH.write_bytes(_dumps(cache))
+
+
+async def upload_to_ipfs(
+    session: aiohttp.ClientSession,
+    target_path: Path,
+    cid_cache: dict[str, str] | None = None,
+) -> str | None:
+    """
+    通过 HTTP API 上传一个文件或整个文件夹到 IPFS。
+    传入 cid_cache 时，内容未变化的输入直接复用缓存中的 CID。
     """
     if not target_path.exists():
         print(f"❌ 路径不存在: {target_path}")
         return None
 
-    safe_path = shlex.quote(str(target_path))
-    command = f"ipfs add -r -Q --cid-version 1 {safe_path}"
-
     try:
-        print(f"\n--- 正在执行上传命令: {command} ---")
-        result = subprocess.run(
-            command, shell=True, check=True, capture_output=True, text=True
-        )
-        cid = result.stdout.strip()
-        print("✅ 上传成功!")
-        print(f"   - 名称: {target_path.name}")
-        print(f"   - CID: {cid}")
+        digest = None
+        if cid_cache is not None:
+            # 摘要计算需要读取全部文件，放到线程中执行以免阻塞事件循环
+            digest = await asyncio.to_thread(_content_digest, target_path)
+        if (
+            cid_cache is not None
+            and digest in cid_cache
+            and await _ipfs_is_pinned(session, cid_cache[digest])
+        ):
+            cid = cid_cache[digest]
+            if not QUIET:
+                print(f"\n♻️  内容未变化，复用缓存的 CID: {target_path.name} -> {cid}")
+            return cid
+
+        if not QUIET:
+            print(f"\n--- 正在上传: {target_path} ---")
+        if target_path.is_dir():
+            # 包裹目录的 CID 只取决于目录内容，与 `ipfs add -r` 得到的文件夹 CID 相同
+            cid = await _ipfs_add(
+                session,
+                _collect_folder_parts(target_path),
+                params={"wrap-with-directory": "true"},
+            )
+        else:
+            cid = await _ipfs_add(session, [_file_part(target_path.name, target_path)])
+        if cid_cache is not None and digest is not None:
+            cid_cache[digest] = cid
+        if not QUIET:
+            print("✅ 上传成功!")
+            print(f"   - 名称: {target_path.name}")
+            print(f"   - CID: {cid}")
         return cid
-    except subprocess.CalledProcessError as e:
-        print(f"❌ 上传失败 (命令返回非零退出码): {e}")
-        print(f"   - 错误信息: {e.stderr.strip()}")
+    except TimeoutError:
+        print(f"❌ 上传失败 (连接 IPFS 节点超时): {target_path}")
+        return None
+    except aiohttp.ClientError as e:
+        print(f"❌ 上传失败 (IPFS API 请求出错): {e}")
         return None
     except Exception as e:
         print(f"❌ 执行上传命令时发生未知错误: {e}")
         return None
 
 
-def upload_json_str_to_ipfs(
+async def upload_json_str_to_ipfs(
+    session: aiohttp.ClientSession,
     data: dict[str, Any],
 ) -> str | None:
     """
     将一个 Python 字典 (JSON 对象) 作为字符串直接上传到 IPFS。
     """
     try:
-        print("\n--- 正在上传 JSON 对象 ---")
-        json_string = json.dumps(data)
-        command = "ipfs add -Q --cid-version 1"
-        result = subprocess.run(
-            command,
-            shell=True,
-            check=True,
-            input=json_string,
-            capture_output=True,
-            text=True,
+        if not QUIET:
+            print("\n--- 正在上传 JSON 对象 ---")
+        cid = await _ipfs_add(
+            session, [("metadata.json", _dumps(data), "application/json")]
         )
-        cid = result.stdout.strip()
-        print("✅ JSON 元数据上传成功!")
-        print(f"   - CID: {cid}")
+        if not QUIET:
+            print("✅ JSON 元数据上传成功!")
+            print(f"   - CID: {cid}")
         return cid
-    except subprocess.CalledProcessError as e:
+    except TimeoutError:
+        print("❌ 上传 JSON 失败 (连接 IPFS 节点超时)")
+        return None
+    except aiohttp.ClientError as e:
         print(f"❌ 上传 JSON 失败: {e}")
-        print(f"   - 错误信息: {e.stderr.strip()}")
         return None
     except Exception as e:
         print(f"❌ 执行 JSON 上传时发生未知错误: {e}")
         return None
 
 
+async def upload_files_to_ipfs(
+    session: aiohttp.ClientSession,
+    files: list[tuple[str, bytes]],
+    cid_cache: dict[str, str] | None = None,
+) -> str | None:
+    """
+    将内存中的多个文件一次性上传，并包裹在同一个目录中，返回该目录的 CID。
+    传入 cid_cache 时，内容未变化的文件组直接复用缓存中的 CID。
+    """
+    try:
+        digest = _files_digest(files) if cid_cache is not None else None
+        if (
+            cid_cache is not None
+            and digest in cid_cache
+            and await _ipfs_is_pinned(session, cid_cache[digest])
+        ):
+            cid = cid_cache[digest]
+            if not QUIET:
+                print(f"\n♻️  {len(files)} 个文件内容未变化，复用缓存的 CID: {cid}")
+            return cid
+
+        if not QUIET:
+            print(f"\n--- 正在批量上传 {len(files)} 个文件 ---")
+        cid = await _ipfs_add(
+            session,
+            [(name, content, "application/json") for name, content in files],
+            params={"wrap-with-directory": "true"},
+        )
+        if cid_cache is not None and digest is not None:
+            cid_cache[digest] = cid
+        if not QUIET:
+            print("✅ 批量上传成功!")
+            print(f"   - CID: {cid}")
+        return cid
+    except TimeoutError:
+        print("❌ 批量上传失败 (连接 IPFS 节点超时)")
+        return None
+    except aiohttp.ClientError as e:
+        print(f"❌ 批量上传失败: {e}")
+        return None
+    except Exception as e:
+        print(f"❌ 执行批量上传时发生未知错误: {e}")
+        return None
+
+
+class _Progress:
+    """
+    线程安全的进度计数器。工作线程只负责累加计数，由一个后台线程每隔
+    PROGRESS_INTERVAL 秒汇总输出一次，避免大量线程逐条 print 争抢 stdout。
+    """
+
+    def __init__(self, label: str, total: int):
+        self.label: str = label
+        self.total: int = total
+        self._done: int = 0
+        self._lock: threading.Lock = threading.Lock()
+        self._stopped: threading.Event = threading.Event()
+        self._reporter: threading.Thread = threading.Thread(
+            target=self._run, daemon=True
+        )
+
+    def __enter__(self) -> "_Progress":
+        self._reporter.start()
+        return self
+
+    def __exit__(self, *_: object):
+        self._stopped.set()
+        self._reporter.join()
+        self._report()
+
+    def advance(self, count: int = 1):
+        with self._lock:
+            self._done += count
+
+    def _run(self):
+        while not self._stopped.wait(PROGRESS_INTERVAL):
+            self._report()
+
+    def _report(self):
+        with self._lock:
+            done = self._done
+        _ = sys.stdout.write(f"   - {self.label}: [{done}/{self.total}]\n")
+        _ = sys.stdout.flush()
+
+
+def _link_or_copy(src: str, dst: str) -> str:
+    """
+    优先创建硬链接，跨文件系统等无法链接的情况下回退为普通复制。
+    """
+    try:
+        os.link(src, dst)
+        return dst
+    except OSError:
+        return shutil.copy2(src, dst)
+
+
 ################################################################
 # 工作流一：处理单个 NFT
 ################################################################
 
 
-def process_single_nft(image_path: Path):
+async def process_single_nft(image_path: Path):
     """
     处理单个 NFT 的流程，并在本地创建一个包含图片和元数据的独立文件夹。
     """
@@ -93,35 +506,38 @@ def process_single_nft(image_path: Path):
     print(f"   - 文件后缀模式: {'.json' if USE_JSON_SUFFIX else '无'}")
     print("==============================================")
 
-    image_cid = upload_to_ipfs(image_path)
-    if not image_cid:
-        return
-
-    print(f"\n🖼️  图片 CID 已获取: {image_cid}")
+    async with _ipfs_session() as session:
+        image_cid = await upload_to_ipfs(session, image_path)
+        if not image_cid:
+            return
 
-    metadata = {
-        "name": image_path.stem,
-        "description": f"这是一个为图片 {image_path.name} 动态生成的元数据。",
-        "image": f"ipfs://{image_cid}",
-        "attributes": [{"trait_type": "类型", "value": "单件艺术品"}],
-    }
+        print(f"\n🖼️  图片 CID 已获取: {image_cid}")
 
-    metadata_cid = upload_json_str_to_ipfs(metadata)
-    if not metadata_cid:
-        return
+        metadata = {
+            "name": image_path.stem,
+            "description": f"这是一个为图片 {image_path.name} 动态生成的元数据。",
+            "image": f"ipfs://{image_cid}",
+            "attributes": [{"trait_type": "类型", "value": "单件艺术品"}],
+        }
 
-    # ✅ 创建独立的输出文件夹，并将图片和 JSON 都保存在里面
-    output_dir = Path(__file__).parent / "output" / image_path.stem
-    output_dir.mkdir(parents=True, exist_ok=True)
+        # ✅ 创建独立的输出文件夹，并将图片和 JSON 都保存在里面
+        output_dir = OUTPUT_ROOT / image_path.stem
+        output_dir.mkdir(parents=True, exist_ok=True)
 
-    # 复制图片
-    _ = shutil.copy(image_path, output_dir / image_path.name)
+        # ✅ 复制图片与上传 JSON 互不依赖，两者并发执行
+        metadata_cid, _ = await asyncio.gather(
+            upload_json_str_to_ipfs(session, metadata),
+            asyncio.to_thread(
+                shutil.copyfile, image_path, output_dir / image_path.name
+            ),
+        )
+        if not metadata_cid:
+            return
 
     # 根据配置开关决定文件名
     file_name = f"{image_path.stem}.json" if USE_JSON_SUFFIX else image_path.stem
     output_file_path = output_dir / file_name
-    with open(output_file_path, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, indent=4, ensure_ascii=False)
+    _ = output_file_path.write_bytes(_dumps(metadata, indent=True))
 
     print(f"\n💾 图片和元数据已在本地打包保存至: {output_dir}")
     print("\n--- ✨ 单件流程完成 ✨ ---")
@@ -133,7 +549,127 @@ def process_single_nft(image_path: Path):
 ################################################################
 
 
-def process_batch_collection(images_input_dir: Path):
+# 集合元数据的固定骨架，每张图片只需复制后填入变化的字段 (键的顺序保持不变)
+_BATCH_METADATA_TEMPLATE: dict[str, Any] = {
+    "name": None,
+    "description": "MetaCore 集合中的一个独特成员。",
+    "image": None,
+    "attributes": None,
+}
+
+
+def _build_batch_metadata(
+    image_file: Path, images_folder_cid: str
+) -> tuple[str, bytes]:
+    """
+    为集合中的一张图片生成元数据，返回 (文件名, JSON 内容)。
+    """
+    token_id = image_file.stem
+    metadata = _BATCH_METADATA_TEMPLATE.copy()
+    metadata["name"] = f"MetaCore #{token_id}"
+    metadata["image"] = f"ipfs://{images_folder_cid}/{image_file.name}"
+    metadata["attributes"] = [{"trait_type": "ID", "value": int(token_id)}]
+    # ✅ 根据配置开关决定文件名
+    file_name = f"{token_id}.json" if USE_JSON_SUFFIX else token_id
+    return file_name, _dumps(metadata, indent=True)
+
+
+# 以二进制方式新建/覆盖文件 (Windows 上需要 O_BINARY 避免换行符被转换)
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+
+
+def _write_metadata_file(
+    output_dir: Path, dir_fd: int | None, metadata_file: tuple[str, bytes]
+):
+    """
+    将一个元数据文件写入本地输出文件夹。
+    直接使用 os.open/os.write，跳过 open() 额外的 stat 和缓冲层。
+    传入输出文件夹的 dir_fd 时按文件名相对打开，内核只需解析一级路径。
+    """
+    file_name, content = metadata_file
+    path = file_name if dir_fd is not None else output_dir / file_name
+    fd = os.open(path, _WRITE_FLAGS, 0o644, dir_fd=dir_fd)
+    try:
+        view = memoryview(content)
+        while view:
+            view = view[os.write(fd, view) :]
+    finally:
+        os.close(fd)
+
+
+def _list_image_files(images_input_dir: Path) -> list[Path]:
+    """
+    列出图片文件夹中的所有图片，按文件名排序。
+    """
+    # ✅ os.scandir 直接使用目录项中缓存的文件类型，普通文件无需再逐个 stat
+    # 与上传一致，符号链接指向的图片同样会生成元数据，隐藏文件 (如 ._1.png) 则跳过
+    with os.scandir(images_input_dir) as entries:
+        return sorted(
+            (
+                Path(entry.path)
+                for entry in entries
+                if entry.is_file()
+                and not entry.name.startswith(".")
+                and entry.name.lower().endswith(IMAGE_EXTS)
+            ),
+            key=lambda p: p.name,
+        )
+
+
+def _copy_images(images_input_dir: Path, images_output_dir: Path):
+    """
+    复制整个图片文件夹到输出目录 (源图片不会被修改，可直接硬链接)。
+    """
+    _ = shutil.copytree(
+        images_input_dir,
+        images_output_dir,
+        copy_function=_link_or_copy if LINK_IMAGES else shutil.copy2,
+    )
+
+
+def _build_all_metadata(
+    image_files: list[Path], images_folder_cid: str
+) -> list[tuple[str, bytes]]:
+    """
+    使用线程池为所有图片生成元数据，结果顺序与 image_files 一致。
+    """
+    with _Progress("生成元数据", len(image_files)) as progress:
+
+        def build(image_file: Path) -> tuple[str, bytes]:
+            metadata_file = _build_batch_metadata(image_file, images_folder_cid)
+            progress.advance()
+            return metadata_file
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            return list(executor.map(build, image_files))
+
+
+def _save_all_metadata(output_dir: Path, metadata_files: list[tuple[str, bytes]]):
+    """
+    使用线程池将所有元数据写入本地输出文件夹。
+    """
+    # 清理旧文件，防止混淆
+    shutil.rmtree(output_dir, ignore_errors=True)
+    output_dir.mkdir(parents=True)
+
+    # ✅ 只打开一次输出文件夹，之后每个文件都相对它创建 (不支持 dir_fd 的平台回退为完整路径)
+    # 与 os.chdir 不同，dir_fd 不会改变进程的工作目录，在多线程中也是安全的
+    dir_fd = os.open(output_dir, os.O_RDONLY) if os.open in os.supports_dir_fd else None
+    try:
+        with _Progress("写入元数据", len(metadata_files)) as progress:
+
+            def save(metadata_file: tuple[str, bytes]):
+                _write_metadata_file(output_dir, dir_fd, metadata_file)
+                progress.advance()
+
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                _ = list(executor.map(save, metadata_files))
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+
+
+async def process_batch_collection(images_input_dir: Path):
     """
     处理整个 NFT 集合的流程，并在本地创建一个包含 images 和 metadata 两个子文件夹的集合文件夹。
     """
@@ -142,57 +678,53 @@ def process_batch_collection(images_input_dir: Path):
     print(f"   - 文件后缀模式: {'.json' if USE_JSON_SUFFIX else '无'}")
     print("==============================================")
 
-    images_folder_cid = upload_to_ipfs(images_input_dir)
-    if not images_folder_cid:
-        return
-
-    print(f"\n🖼️  图片文件夹 CID 已获取: {images_folder_cid}")
-
     # ✅ 为本次批量处理创建一个带时间戳的唯一父文件夹
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    collection_output_dir = Path(__file__).parent / "output" / f"collection_{timestamp}"
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    collection_output_dir = OUTPUT_ROOT / f"collection_{timestamp}"
     images_output_dir = collection_output_dir / "images"
     metadata_output_dir = collection_output_dir / "metadata"
 
-    # 复制整个图片文件夹到输出目录
-    _ = shutil.copytree(images_input_dir, images_output_dir)
-    print(f"\n💾 所有图片已复制到: {images_output_dir}")
-
-    print("\n--- 正在为每张图片生成元数据 JSON 文件 ---")
-    metadata_output_dir.mkdir(parents=True, exist_ok=True)
+    # ✅ 读取 CID 缓存，重复运行时未变化的图片和元数据无需重新上传
+    cid_cache = _load_cid_cache()
 
-    # 清理旧文件，防止混淆
-    for old_file in metadata_output_dir.glob("*"):
-        if old_file.is_file():
-            old_file.unlink()
-
-    image_files = sorted(
-        [
-            f
-            for f in images_input_dir.iterdir()
-            if f.is_file()
-            and f.name.lower().endswith((".png", ".jpg", ".jpeg", ".gif"))
-        ]
-    )
+    async with _ipfs_session() as session:
+        # ✅ 上传图片文件夹的同时，在线程中复制图片并扫描图片列表
+        images_folder_cid, _, image_files = await asyncio.gather(
+            upload_to_ipfs(session, images_input_dir, cid_cache),
+            asyncio.to_thread(_copy_images, images_input_dir, images_output_dir),
+            asyncio.to_thread(_list_image_files, images_input_dir),
+        )
+        if not images_folder_cid:
+            return
+        _save_cid_cache(cid_cache)
 
-    for image_file in image_files:
-        token_id = image_file.stem
-        metadata = {
-            "name": f"MetaCore #{token_id}",
-            "description": "MetaCore 集合中的一个独特成员。",
-            "image": f"ipfs://{images_folder_cid}/{image_file.name}",
-            "attributes": [{"trait_type": "ID", "value": int(token_id)}],
-        }
-        # ✅ 根据配置开关决定文件名
-        file_name = f"{token_id}.json" if USE_JSON_SUFFIX else token_id
-        with open(metadata_output_dir / file_name, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, indent=4, ensure_ascii=False)
+        print(f"\n🖼️  图片文件夹 CID 已获取: {images_folder_cid}")
+        print(f"\n💾 所有图片已复制到: {images_output_dir}")
 
-    print(f"✅ 成功生成 {len(image_files)} 个元数据文件到: {metadata_output_dir}")
+        print("\n--- 正在为每张图片生成元数据 JSON 文件 ---")
+        # ✅ 元数据只在内存中生成，随后一次性上传，无需先写盘再读回
+        metadata_files = await asyncio.to_thread(
+            _build_all_metadata, image_files, images_folder_cid
+        )
+        print(f"✅ 成功生成 {len(metadata_files)} 个元数据文件")
 
-    metadata_folder_cid = upload_to_ipfs(metadata_output_dir)
-    if not metadata_folder_cid:
-        return
+        # ✅ 上传元数据的同时在线程中写入本地副本
+        # 本地副本与上传的内容逐字节一致，上传到 Pinata 后得到的 CID 也相同
+        tasks: list[Awaitable[Any]] = [
+            upload_files_to_ipfs(session, metadata_files, cid_cache)
+        ]
+        if SAVE_METADATA_LOCALLY:
+            tasks.append(
+                asyncio.to_thread(
+                    _save_all_metadata, metadata_output_dir, metadata_files
+                )
+            )
+        metadata_folder_cid, *_ = await asyncio.gather(*tasks)
+        if SAVE_METADATA_LOCALLY:
+            print(f"💾 元数据文件已保存到: {metadata_output_dir}")
+        if not metadata_folder_cid:
+            return
+        _save_cid_cache(cid_cache)
 
     print(f"\n📄 元数据文件夹 CID 已获取: {metadata_folder_cid}")
     print("\n--- ✨ 批量流程完成 ✨ ---")
@@ -211,8 +743,13 @@ if __name__ == "__main__":
     batch_images_path = current_dir.parent / "assets" / "batch_images"
     batch_images_path.mkdir(parents=True, exist_ok=True)
 
+    if IPFS_BIN is None:
+        print("❌ 未找到 ipfs 命令。")
+        print("请先安装 Kubo 并确保 ipfs 位于 PATH 中。")
+        exit()
+
     try:
-        _ = subprocess.run("ipfs id", shell=True, check=True, capture_output=True)
+        _ = subprocess.run([IPFS_BIN, "id"], check=True, capture_output=True)
         print("✅ 成功连接到 IPFS 节点")
     except subprocess.CalledProcessError:
         print("❌ 连接 IPFS 节点失败。")
@@ -222,10 +759,10 @@ if __name__ == "__main__":
     # --- 在这里选择要运行的工作流 ---
 
     # 运行工作流一：处理单个 NFT
-    # process_single_nft(single_image_path)
+    # asyncio.run(process_single_nft(single_image_path))
 
     # 运行工作流二：处理批量 NFT 集合
-    process_batch_collection(batch_images_path)
+    asyncio.run(process_batch_collection(batch_images_path))
 
     # ✅ 生产环境最终发布流程说明
     print("\n======================================================================")